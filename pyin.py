@@ -3,16 +3,16 @@
 
 import abc
 import argparse
+import ast
 from collections import deque
 from collections.abc import Iterable
 import builtins
-import csv
 import functools
 import importlib.util
 import inspect
 import io
 import itertools as it
-import json
+import keyword
 import operator as op
 import os
 import re
@@ -61,6 +61,9 @@ _DEFAULT_STREAM_VARIABLE = 's'
 _EVAL_DIRECTIVE = '%eval'
 _IMPORTER_REGEX = re.compile(r"([a-zA-Z_.][a-zA-Z0-9_.]*)")
 _DIRECTIVE_REGISTRY = {}
+# Input and output files are read and written line-by-line. A large buffer
+# coalesces these into fewer system calls when working with regular files.
+_IO_BUFFER_SIZE = 1024 ** 2
 _DEFAULT_SCOPE = {
     '__builtins__': builtins,
     'it': it,
@@ -145,13 +148,14 @@ def compile(
     if scope is None:
         scope = {}
 
-    tokens = list(expressions)
+    # Tokens are consumed from the front. 'list.pop(0)' is O(n).
+    tokens = deque(expressions)
     del expressions
 
     while tokens:
 
         # Get a directive
-        directive = tokens.pop(0)
+        directive = tokens.popleft()
 
         if directive == '' or directive.isspace():
             raise SyntaxError(
@@ -163,7 +167,7 @@ def compile(
         # queue so that it can be evaluated as an argument - makes the rest
         # of the code simpler.
         if directive[0] != '%':
-            tokens.insert(0, directive)
+            tokens.appendleft(directive)
             directive = _EVAL_DIRECTIVE
 
         if directive not in _DIRECTIVE_REGISTRY:
@@ -172,18 +176,11 @@ def compile(
 
         # Operation classes define how many arguments are associated with the
         # directives they service with annotated positional-only arguments.
-        # Find them.
-
-        sig = inspect.signature(cls.__init__)
-        pos_only = [
-            p for p in sig.parameters.values()
-            if p.kind == p.POSITIONAL_ONLY
-        ]
-        pos_only = pos_only[1:]  # First is 'self'
+        # These are discovered once when the class is registered.
 
         # Arguments for instantiating argument class
         args = [directive]
-        for param in pos_only[1:]:
+        for param in cls._directive_params[1:]:
 
             # Ran out of CLI arguments but expected more
             if not len(tokens):
@@ -191,7 +188,7 @@ def compile(
                     f"missing argument '{param.name}' for directive:"
                     f" {directive}")
 
-            args.append(param.annotation(tokens.pop(0)))
+            args.append(param.annotation(tokens.popleft()))
 
         # 'OpBaseExpression()' is special in that it receives scope information
         # for Python's builtin 'eval()' and 'exec()' functions, and associated
@@ -227,9 +224,9 @@ def importer(expressions, scope):
     :rtype dict:
     """
 
-    # Find all potential modules to try and import
-    all_matches = set(it.chain.from_iterable(
-        re.findall(_IMPORTER_REGEX, expr) for expr in expressions))
+    # Find all potential modules to try and import. A newline cannot appear in
+    # a match, so joining allows for scanning all expressions at once.
+    all_matches = set(_IMPORTER_REGEX.findall('\n'.join(expressions)))
 
     for match in all_matches:
 
@@ -239,22 +236,35 @@ def importer(expressions, scope):
         module = match.split('.', 1)[0]
 
         # Try and limit the number of import attempts, but only when confident.
-        if not module or hasattr(builtins, module):
+        # A failed import attempt searches 'sys.path', which is expensive.
+        # Keywords and builtins cannot be modules, and objects already in the
+        # scope do not need to be imported.
+        if (not module
+                or hasattr(builtins, module)
+                or keyword.iskeyword(module)
+                or module in scope):
+            continue
+
+        # Previously imported. No need to go through the import machinery.
+        elif sys.modules.get(module) is not None:
+            scope[module] = sys.modules[module]
+            continue
+
+        # Most candidates are not modules. Probing for a module is cheaper
+        # than letting an import attempt raise and catching the exception.
+        elif importlib.util.find_spec(module) is None:
             continue
 
         try:
             scope[module] = importlib.import_module(module)
 
-        # Failed to import. To be helpful, check and see if the module exists.
-        # if it does, the caller is referencing something that cannot be
-        # imported, like a class method. Unclear how to trigger this in a test.
-        except ImportError:  # pragma no cover
-            res = importlib.util.find_spec(module)
-            if res is not None:
-                raise ImportError(
-                    f"attempting to import something that cannot be imported"
-                    f" from a module that does exist: {match}"
-                )  # pragma no cover
+        # Failed to import a module that does exist. The caller is referencing
+        # something that cannot be imported, like a class method.
+        except ImportError:
+            raise ImportError(
+                f"attempting to import something that cannot be imported"
+                f" from a module that does exist: {match}"
+            )
 
     return scope
 
@@ -271,8 +281,9 @@ def eval(
     """Evaluate Python expressions across a stream of data.
 
     Expressions are passed through ``importer()`` to construct a scope, and
-    then evaluated one-by-one across each item in ``stream`` by Python's
-    ``eval()``.
+    then evaluated one-by-one across each item in ``stream``. Most
+    expressions are compiled to a function taking ``variable`` as its only
+    argument, with ``scope`` as its global scope.
 
     :param str or sequence expressions:
         One or more expressions.
@@ -319,22 +330,89 @@ def eval(
 # Operations
 
 
-def _peek(iterable):
+@functools.lru_cache(maxsize=256)
+def _compile(expression, mode):
+
+    """Compile a Python expression with the builtin ``compile()``.
+
+    Code objects are immutable, so the same expression is only compiled once
+    even when many operations and many calls to ``eval()`` use it.
+
+    :param str expression:
+        Python expression or statement.
+    :param str mode:
+        Passed to ``compile()``. Like ``eval`` or ``exec``.
+
+    :rtype code:
+    """
+
+    return builtins.compile(expression, '<string>', mode)
+
 
-    """Peek at the first item of an iterable.
+@functools.lru_cache(maxsize=256)
+def _compile_function(expression, variable):
 
-    :param iterable iterable:
-        Get the first item from this iterable.
+    """Compile a Python expression to ``lambda <variable>: <expression>``.
+
+    The expression is parsed on its own and placed in the body of a ``lambda``
+    via its AST, so a malformed expression cannot alter the function's
+    structure, and syntax errors reference only the expression.
+
+    Not all expressions behave the same inside of a function. These produce
+    ``None``, and the caller must evaluate the expression directly instead.
+
+    :param str expression:
+        Python expression.
+    :param str variable:
+        Name of the function's only argument.
+
+    :rtype code or None:
 
     :return:
-        A ``tuple`` with two elements. The first is the next value in
-        ``iterable``, and the second is the reconstructed iterable, but
-        likely as a different type.
+        Evaluating this code object produces the function.
+    """
+
+    # Placing the expression inside a function changes what the compiler
+    # accepts. For example, '(yield i)' would silently produce a generator
+    # function instead of raising 'SyntaxError'. Compiling the bare expression
+    # first ensures errors match evaluating it directly.
+    _compile(expression, 'eval')
+
+    body = ast.parse(expression, filename='<string>', mode='eval').body
+
+    # An assignment expression binds its target as a local variable of the
+    # function. Something like '(n := n + i)', where 'n' is in the global
+    # scope, would then produce 'UnboundLocalError' instead of reading the
+    # global.
+    if any(isinstance(node, ast.NamedExpr) for node in ast.walk(body)):
+        return None
+
+    args = ast.arguments(
+        posonlyargs=[],
+        args=[ast.arg(arg=variable)],
+        kwonlyargs=[],
+        kw_defaults=[],
+        defaults=[]
+    )
+    tree = ast.Expression(body=ast.Lambda(args=args, body=body))
+
+    return builtins.compile(
+        ast.fix_missing_locations(tree), '<string>', 'eval')
+
+
+class _FakeFile:
+
+    """File-like object that does not actually write to a file.
+
+    ``csv.DictWriter.writerow()`` returns the value returned by the
+    underlying ``write()`` method, so returning ``data`` is enough to get a
+    line of text to pass down the line.
     """
 
-    iterable = (i for i in iterable)
-    first = next(iterable)
-    return first, it.chain([first], iterable)
+    __slots__ = ()
+
+    def write(self, data):
+        return data
 
 
 class OpBase(abc.ABC):
@@ -434,6 +512,10 @@ class OpBase(abc.ABC):
                     f" '{cls.__name__}.__init__()' must have a type annotation"
                 )
 
+        # Cache for 'compile()', which would otherwise have to inspect the
+        # signature for every directive it encounters.
+        cls._directive_params = tuple(pos_only)
+
         # Register subclasss
         super().__init_subclass__(**kwargs)
         if directives is not None:
@@ -524,7 +606,34 @@ class OpBaseExpression(OpBase, directives=None):
 
         """Compile a Python expression using the builtin ``compile()``."""
 
-        return builtins.compile(self.expression, '<string>', mode)
+        return _compile(self.expression, mode)
+
+    def compiled_function(self):
+
+        """Compile the expression to a function.
+
+        Equivalent to ``lambda <variable>: <expression>`` with ``scope`` as
+        its global scope. Calling a function is much faster than calling
+        ``eval()``, so this is preferred when evaluating the expression
+        against every item.
+
+        Some expressions cannot be placed in a function without changing
+        their behavior. These are instead evaluated with ``eval()`` and a
+        new local scope containing only ``variable`` for every item.
+        """
+
+        code = _compile_function(self.expression, self.variable)
+        if code is not None:
+            return builtins.eval(code, self.scope)
+
+        code = self.compiled_expression('eval')
+        scope = self.scope
+        variable = self.variable
+
+        def func(item):
+            return builtins.eval(code, scope, {variable: item})
+
+        return func
 
 
 class OpEval(OpBaseExpression, directives=('%eval', '%stream', '%exec')):
@@ -558,12 +667,14 @@ class OpEval(OpBaseExpression, directives=('%eval', '%stream', '%exec')):
         # Compile the expression before doing anything else. If 'stream' is
         # empty then some of the code below doesn't execute. Unfortunately
         # this can only happen at runtime since this operation handles both
-        # 'exec()' and 'eval()'.
+        # 'exec()' and 'eval()'. '%eval' is executed for every item, so it is
+        # compiled to a function, which is much cheaper to call than 'eval()'.
         if self.directive == '%exec':
-            mode = 'exec'
+            compiled_expression = self.compiled_expression('exec')
+        elif self.directive == '%eval':
+            func = self.compiled_function()
         else:
-            mode = 'eval'
-        compiled_expression = self.compiled_expression(mode)
+            compiled_expression = self.compiled_expression('eval')
 
         if self.directive == '%stream':
 
@@ -578,13 +689,7 @@ class OpEval(OpBaseExpression, directives=('%eval', '%stream', '%exec')):
             )
 
         elif self.directive == '%eval':
-
-            for item in stream:
-                yield builtins.eval(
-                    compiled_expression,
-                    self.scope,
-                    {self.variable: item}
-                )
+            yield from map(func, stream)
 
         elif self.directive == '%exec':
 
@@ -704,43 +809,22 @@ class OpFilter(OpBaseExpression, directives=('%filter', '%filterfalse')):
 
     def __call__(self, stream):
 
-        # Can't just use 'filter()' and 'it.filterfalse()' directly since we
-        # have to evaluate a Python expression somewhere. Instead, fork the
-        # stream and use one copy for evaluating expressions, and one copy
-        # for values to emit.
-
-        is_none = self.expression.lower() == 'none'
-
-        # Just use 'filter()'. Hard to express as interactions with the
-        # parent 'OpEval()' class.
-        if is_none and self.directive == '%filter':
-            return filter(None, stream)
-
-        # Just use 'itertools.filterfalse()'. Hard to express as interactions
-        # with the parent 'OpEval()' class.
-        elif is_none and self.directive == '%filterfalse':
-            return it.filterfalse(None, stream)
+        # Select items based on their own truthiness.
+        if self.expression.lower() == 'none':
+            func = None
 
-        # Implement via 'itertools.compress()'. Equivalent to:
-        #   filter(lambda i: <expression>, stream)
-        # which is extremely hard to structure. Instead, just rely on Python's
-        # 'truthy' checks.
-        elif self.directive in ('%filter', '%filterfalse'):
+        # Equivalent to 'lambda i: <expression>'. Passing a function directly
+        # to 'filter()' and 'it.filterfalse()' evaluates the expression and
+        # emits items in a single pass, unlike forking the stream with
+        # 'it.tee()', which buffers items until both copies consume them.
+        else:
+            func = self.compiled_function()
 
-            stream, selection = it.tee(stream, 2)
+        if self.directive == '%filter':
+            return filter(func, stream)
 
-            selection = (
-                builtins.eval(
-                    self.compiled_expression('eval'),
-                    self.scope,
-                    {self.variable: item}
-                )
-                for item in selection
-            )
-            if self.directive == '%filterfalse':
-                selection = (not s for s in selection)
-
-            return it.compress(stream, selection)
+        elif self.directive == '%filterfalse':
+            return it.filterfalse(func, stream)
 
         else:  # pragma no cover
             raise DirectiveError(self.directive)
@@ -781,11 +865,18 @@ class OpJSON(OpBase, directives=('%json', )):
 
     def __call__(self, stream):
 
+        # Sniff the first item directly from the iterator rather than through
+        # a generator wrapping the entire stream. Its result is chained back
+        # in front of 'map()' over the remaining items.
+        stream = iter(stream)
         try:
-            first, stream = _peek(stream)
+            first = next(stream)
         except StopIteration:
             return []
 
+        # Only needed by this directive. Deferred to keep startup fast.
+        import json
+
         # 'json.loads/dumps()' both use these objects internally, but create
         # an instance with every call. Presumably this is faster.
         if isinstance(first, str):
@@ -793,7 +884,7 @@ class OpJSON(OpBase, directives=('%json', )):
         else:
             func = json.JSONEncoder().encode
 
-        return map(func, stream)
+        return it.chain((func(first), ), map(func, stream))
 
 
 class OpCSVDict(OpBase, directives=('%csvd', )):
@@ -807,36 +898,32 @@ class OpCSVDict(OpBase, directives=('%csvd', )):
 
     def __call__(self, stream):
 
+        stream = iter(stream)
         try:
-            first, stream = _peek(stream)
+            first = next(stream)
         except StopIteration:
             return
 
+        # Only needed by this directive. Deferred to keep startup fast.
+        import csv
+
         # Reading from a CSV
         if isinstance(first, str):
-            yield from csv.DictReader(stream)
+            yield from csv.DictReader(it.chain([first], stream))
 
         # Writing to a CSV
         else:
 
-            # This file-like object doesn't actually write to a file. Since
-            # 'csv.DictWriter.write()' just returns values up the chain, just
-            # returning from 'FakeFile.write()' is enough to get a line of
-            # text to pass down the line.
-            class FakeFile:
-                def write(self, data):
-                    return data
-
             writer = csv.DictWriter(
-                FakeFile(),
+                _FakeFile(),
                 fieldnames=list(first.keys()),
                 quoting=csv.QUOTE_ALL,
                 lineterminator='',  # pyin itself handles newline characters
             )
 
             yield writer.writeheader()
-            for row in stream:
-                yield writer.writerow(row)
+            yield writer.writerow(first)
+            yield from map(writer.writerow, stream)
 
 
 class OpReversed(OpBase, directives=('%rev', '%revstream')):
@@ -852,18 +939,23 @@ class OpReversed(OpBase, directives=('%rev', '%revstream')):
         # Reverse each item
         if self.directive in ('%rev', '%reversed'):
 
+            stream = iter(stream)
             try:
-                first, stream = _peek(stream)
+                first = next(stream)
             except StopIteration:
                 return
 
+            # The type is only checked once, and the remaining items are
+            # reversed entirely by C-level callables driven by 'map()'.
+            stream = it.chain([first], stream)
+
             # Can reverse these objects by slicing while preserving the
             # original type.
             if isinstance(first, (str, list, tuple)):
-                yield from (i[::-1] for i in stream)
+                yield from map(op.itemgetter(slice(None, None, -1)), stream)
 
             else:
-                yield from (tuple(reversed(i)) for i in stream)
+                yield from map(tuple, map(reversed, stream))
 
         # Reverse entire stream
         elif self.directive in ('%revstream', '%reversedstream'):
@@ -899,13 +991,25 @@ class OpBatched(OpBase, directives=('%batched', )):
         super().__init__(directive, **kwargs)
         self.chunksize = chunksize
 
+        # 'itertools.batched()' rejects these, but the 'itertools.islice()'
+        # fallback silently produces nothing. Behave the same on all versions.
+        if self.chunksize < 1:
+            raise ValueError(
+                f"chunk size must be at least 1 for directive"
+                f" {self.directive}: {self.chunksize}")
+
     def __call__(self, stream):
 
-        # 'itertools.batched()' was introduced in Python 3.12 and cannot
-        # be used
-        stream = (i for i in stream)
-        while chunk := tuple(it.islice(stream, self.chunksize)):
-            yield tuple(chunk)
+        # 'itertools.batched()' was introduced in Python 3.12, and produces
+        # each chunk with a single C call. Only one branch can execute for a
+        # given version of Python, so both are excluded from coverage.
+        if hasattr(it, 'batched'):  # pragma no cover
+            yield from it.batched(stream, self.chunksize)
+
+        else:  # pragma no cover
+            stream = iter(stream)
+            while chunk := tuple(it.islice(stream, self.chunksize)):
+                yield chunk
 
 
 class OpStrNoArgs(OpBase, directives=(
@@ -936,6 +1040,16 @@ class OpStrOneArg(OpBase, directives=(
     but without a default value.
     """
 
+    # Directives that do not map directly to a 'str' method name.
+    _method_names = {
+        '%strips': 'strip',
+        '%lstrips': 'lstrip',
+        '%rstrips': 'rstrip',
+        '%splits': 'split',
+        '%lsplits': 'lsplit',
+        '%rsplits': 'rsplit',
+    }
+
     def __init__(self, directive: str, argument: str, /, **kwargs):
 
         """
@@ -950,25 +1064,16 @@ class OpStrOneArg(OpBase, directives=(
         super().__init__(directive, **kwargs)
 
         self.argument = argument
+        self.method_name = self._method_names.get(
+            self.directive, self.directive[1:])
 
     def __call__(self, stream):
 
-        mapping = {
-            '%strips': 'strip',
-            '%lstrips': 'lstrip',
-            '%rstrips': 'rstrip',
-            '%splits': 'split',
-            '%lsplits': 'lsplit',
-            '%rsplits': 'rsplit',
-        }
-
-        method_name = mapping.get(self.directive, self.directive[1:])
-
-        if method_name == 'join':
+        if self.method_name == 'join':
             return map(self.argument.join, stream)
 
         else:
-            func = op.methodcaller(method_name, self.argument)
+            func = op.methodcaller(self.method_name, self.argument)
             return map(func, stream)
 
 
@@ -996,7 +1101,11 @@ class OpReplace(OpBase, directives=('%replace', )):
 
     def __call__(self, stream):
 
-        return map(op.methodcaller('replace', self.old, self.new), stream)
+        # Faster than 'op.methodcaller()', and unlike 'str.replace()' does
+        # not require items to be exactly 'str'.
+        old = self.old
+        new = self.new
+        return (i.replace(old, new) for i in stream)
 
 
 class OpCast(OpBase, directives=(
@@ -1100,7 +1209,7 @@ def argparse_parser():
     input_group.add_argument(
         '-i', '--infile',
         metavar='PATH',
-        type=argparse.FileType('r'),
+        type=argparse.FileType('r', bufsize=_IO_BUFFER_SIZE),
         default='-',
         help="Read input from this file. Use '-' for stdin (the default)."
     )
@@ -1108,7 +1217,7 @@ def argparse_parser():
     aparser.add_argument(
         '-o', '--outfile',
         metavar='PATH',
-        type=argparse.FileType('w'),
+        type=argparse.FileType('w', bufsize=_IO_BUFFER_SIZE),
         default='-',
         help="Write to this file. Use '-' for stdout (the default)."
     )
@@ -1192,7 +1301,8 @@ def main(
         linesep,
         setup,
         variable,
-        stream_variable):
+        stream_variable,
+        parser=None):
 
     """Command line interface.
 
@@ -1215,6 +1325,9 @@ def main(
         Expressions reference input data via this variable.
     :param str stream_variable:
         Expressions reference the stream via this variable.
+    :param argparse.ArgumentParser or None parser:
+        Print help with this parser when there is no input data. Constructed
+        with ``argparse_parser()`` if not given.
 
     :rtype int:
 
@@ -1231,20 +1344,21 @@ def main(
     # Run setup 'exec()' statements.
     else:
 
-        # Will eventually be treated as the global scope in 'eval()'. Only
-        # need a local scope to get data out of the 'exec()' calls. Local
-        # scope is copied to global scope.
+        # Will eventually be treated as the global scope in 'eval()'.
         scope = importer(setup, _DEFAULT_SCOPE.copy())
-        local_scope = {}
 
-        # Probably possible to use 'OpEval(%exec)' here, but not immediately
-        # clear how to manifest the scope changes.
-        for statement in setup:
-            code_object = builtins.compile(statement, '<string>', 'exec')
-            exec(code_object, scope, local_scope)
-            scope.update(local_scope)
+        # Compile everything before executing anything. A syntax error in
+        # any statement is reported before the others have side effects.
+        code_objects = [
+            _compile(statement, 'exec') for statement in setup
+        ]
 
-        del local_scope
+        # Executing with only a global scope writes new objects directly into
+        # 'scope', like a module. There is no separate local scope to copy
+        # back after every statement, and functions and comprehensions
+        # defined during setup can see everything else defined during setup.
+        for code_object in code_objects:
+            exec(code_object, scope)
 
     # ==== Fetch Input Data Stream ==== #
 
@@ -1252,7 +1366,9 @@ def main(
     # to 'stdin', and no '--gen' flag. Technically users can type data into
     # 'stdin' in this mode, but that doesn't seem very useful.
     if generate_expr is None and infile.isatty():
-        argparse_parser().print_help()
+        if parser is None:
+            parser = argparse_parser()
+        parser.print_help()
         return 2
 
     # Generating data for input.
@@ -1263,8 +1379,12 @@ def main(
             variable='_'  # Obfuscate the scope a bit
         )
 
+        # 'iter()' is cheaper than an 'Iterable' ABC check, and also accepts
+        # objects that only implement the '__getitem__()' sequence protocol.
         input_stream = next(input_stream)
-        if not isinstance(input_stream, Iterable):
+        try:
+            input_stream = iter(input_stream)
+        except TypeError:
             print(
                 "ERROR: '--gen' expression did not produce an iterable"
                 " object:", generate_expr, file=sys.stderr)
@@ -1279,28 +1399,33 @@ def main(
 
     # ==== Process Data ==== #
 
-    for line in eval(
-            expressions, input_stream, scope=scope,
-            variable=variable, stream_variable=stream_variable):
-
-        if not isinstance(line, str):
-            line = repr(line)
+    # Executed for every line of output. Avoid an attribute lookup per call.
+    write = outfile.write
 
-        try:
-            outfile.write(line)
-            outfile.write(linesep)
-
-        # Probably piping to something like '$ head' that intentionally does
-        # not fully consume the stream. Python docs have a note recommending
-        # handling. Note that this is not an error in our case, so we do not
-        # 'exit(1)'. Unclear how to reliably test this.
-        # https://docs.python.org/3/library/signal.html?#note-on-sigpipe
-        except BrokenPipeError:  # pragma no cover
-            # Python flushes standard streams on exit; redirect remaining output
-            # to devnull to avoid another BrokenPipeError at shutdown
-            devnull = os.open(os.devnull, os.O_WRONLY)
-            os.dup2(devnull, sys.stdout.fileno())
-            break
+    # Handling 'BrokenPipeError' around the entire loop rather than around
+    # each write keeps exception handling setup out of the per-line path.
+    try:
+        for line in eval(
+                expressions, input_stream, scope=scope,
+                variable=variable, stream_variable=stream_variable):
+
+            if not isinstance(line, str):
+                line = repr(line)
+
+            write(line)
+            write(linesep)
+
+    # Probably piping to something like '$ head' that intentionally does
+    # not fully consume the stream. Python docs have a note recommending
+    # handling. Note that this is not an error in our case, so we do not
+    # 'exit(1)'. Unclear how to reliably test this. Resetting 'SIGPIPE' to its
+    # default handler would kill the process with a non-zero exit code.
+    # https://docs.python.org/3/library/signal.html?#note-on-sigpipe
+    except BrokenPipeError:  # pragma no cover
+        # Python flushes standard streams on exit; redirect remaining output
+        # to devnull to avoid another BrokenPipeError at shutdown
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
 
     return 0
 
@@ -1322,10 +1447,11 @@ def _cli_entrypoint(rawargs=None):
     :raises SystemExit:
     """
 
-    args = argparse_parser().parse_args(args=rawargs)
+    aparser = argparse_parser()
+    args = aparser.parse_args(args=rawargs)
 
     try:
-        exit_code = main(**vars(args))
+        exit_code = main(**vars(args), parser=aparser)
 
     except SyntaxError as e:
 
@@ -1339,7 +1465,10 @@ def _cli_entrypoint(rawargs=None):
             f'    {e.text}',
             f'    {" " * (e.offset - 1)}^',
         ]
-        print(os.linesep.join(lines), file=sys.stderr)
+        # 'sys.stderr' is a text stream that translates '\n' to the platform's
+        # line separator. Joining with 'os.linesep' produces '\r\r\n' on
+        # Windows.
+        print('\n'.join(lines), file=sys.stderr)
 
     # User interrupted with '^C' most likely, but technically this is just
     # a SIGINT. Somehow this shows up in the coverage report generated by
@@ -1366,11 +1495,11 @@ def _cli_entrypoint(rawargs=None):
     for attr in ('infile', 'outfile'):
         f = getattr(args, attr)
         try:
-            fileno = getattr(f, 'fileno', lambda: None)()
-        except io.UnsupportedOperation:
+            fd = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
             continue
 
-        if fileno not in (None, 0, 1, 2):
+        if fd not in {0, 1, 2}:
             f.close()
 
     exit(exit_code)
@@ -47,6 +47,24 @@ def test_invalid_expression(expression):
         next(pyin.eval(expression, []))
 
 
+@pytest.mark.parametrize("expressions", [
+    ['(yield i)'],
+    ['(yield from i)'],
+    ['%filter', '(yield i)'],
+    ['%filterfalse', '(yield i)'],
+])
+def test_yield_outside_function(expressions):
+
+    """Expressions are compiled to functions, but ``yield`` is still an
+    error.
+    """
+
+    with pytest.raises(SyntaxError) as e:
+        list(pyin.eval(expressions, range(2)))
+
+    assert "'yield' outside function" in str(e.value)
+
+
 def test_with_generator():
 
     """Generators are valid expressions."""
@@ -58,3 +76,31 @@ def test_with_generator():
     results = list(pyin.eval(expressions, ['word']))
 
     assert results == [True]
+
+
+def test_nested_scope():
+
+    """Comprehensions and functions in expressions can see the variable."""
+
+    expressions = [
+        '[i + j for j in range(2)]',
+        '(lambda: i * 2)()'
+    ]
+    results = list(pyin.eval(expressions, [10]))
+
+    assert results == [[10, 11, 10, 11]]
+
+
+@pytest.mark.parametrize("expressions, expected", [
+    (['(n := n + i)'], [10, 11, 12]),
+    (['%evalif', 'i > 0', '(n := n + i)'], [0, 11, 12]),
+    (['%filter', '(n := n + i) > 11'], [2]),
+    (['%filterfalse', '(n := n + i) > 11'], [0, 1]),
+])
+def test_assignment_expression_global(expressions, expected):
+
+    """Assignment expressions can read a global before rebinding it."""
+
+    results = list(pyin.eval(expressions, range(3), scope={'n': 10}))
+
+    assert results == expected
@@ -3,6 +3,8 @@
 
 import os
 
+import pytest
+
 import pyin
 
 
@@ -15,3 +17,27 @@ def test_update_scope():
 
     assert res is scope
     assert scope == {'os': os}
+
+
+def test_existing_scope():
+
+    """Objects already in the scope are not replaced by imports."""
+
+    scope = {'os': 'not the module'}
+    pyin.importer('os.path.exists(line) if line else None', scope=scope)
+
+    assert scope == {'os': 'not the module'}
+
+
+def test_module_exists_but_cannot_be_imported(monkeypatch, tmp_path):
+
+    """A module that exists but fails to import produces a helpful error."""
+
+    (tmp_path / 'pyin_broken_module.py').write_text("raise ImportError('bad')")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    with pytest.raises(ImportError) as e:
+        pyin.importer('pyin_broken_module.func(line)', scope={})
+
+    assert 'from a module that does exist' in str(e.value)
+    assert 'pyin_broken_module.func' in str(e.value)
@@ -150,6 +150,17 @@ def test_simple_stream(directive, args, stream, expected):
     assert list(pyin.eval(expressions, [])) == []
 
 
+@pytest.mark.parametrize("chunksize", ['0', '-1'])
+def test_OpBatched_invalid_chunksize(chunksize):
+
+    """``%batched`` rejects chunk sizes that cannot produce a chunk."""
+
+    with pytest.raises(ValueError) as e:
+        list(pyin.eval(['%batched', chunksize], range(3)))
+
+    assert 'chunk size must be at least 1' in str(e.value)
+
+
 def test_eval_syntax_error():
 
     """Produce a helpful error when encountering :obj:`SyntaxError`.
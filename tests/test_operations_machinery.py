@@ -118,3 +118,16 @@ def test_DirectiveError():
     exc = pyin.DirectiveError('%example')
 
     assert str(exc) == "invalid directive: %example"
+
+
+def test_compiled_expression_cache():
+
+    """Identical expressions are only compiled once."""
+
+    kwargs = {'variable': 'i', 'stream_variable': 's', 'scope': {}}
+    op1 = pyin.OpEval('%eval', 'i + 1', **kwargs)
+    op2 = pyin.OpEval('%eval', 'i + 1', **kwargs)
+
+    assert op1.compiled_expression('eval') is op2.compiled_expression('eval')
+    assert op1.compiled_expression('eval') \
+        is not op1.compiled_expression('exec')
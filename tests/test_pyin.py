@@ -124,6 +124,19 @@ def test_gen_not_iterable(runner):
         assert item in result.err
 
 
+def test_gen_getitem(runner):
+
+    """``--gen`` accepts objects only implementing ``__getitem__()``."""
+
+    expr = "type('Seq', (), {'__getitem__': lambda self, i: 'ab'[i]})()"
+
+    result = runner.invoke(_cli_entrypoint, ['--gen', expr, 'i.upper()'])
+
+    assert result.exit_code == 0
+    assert not result.err
+    assert result.output == os.linesep.join('AB') + os.linesep
+
+
 def test_bad_directive(runner):
 
     """Catch bad directives."""
@@ -151,6 +164,33 @@ def test_no_arguments_prints_help(runner):
     assert expected == result.output
 
 
+def test_main_no_parser_prints_help(capsys):
+
+    """:func:`pyin.main` constructs a parser for printing help if needed."""
+
+    infile = StringIO()
+    infile.isatty = lambda: True
+
+    exit_code = pyin.main(
+        generate_expr=None,
+        infile=infile,
+        outfile=StringIO(),
+        expressions=[],
+        linesep=os.linesep,
+        setup=None,
+        variable='i',
+        stream_variable='s'
+    )
+
+    with StringIO() as f:
+        pyin.argparse_parser().print_help(file=f)
+        f.seek(0)
+        expected = f.read()
+
+    assert exit_code == 2
+    assert expected == capsys.readouterr().out
+
+
 def test_KeyboardInterrupt():
 
     """:obj:`KeyboardInterrupt` handling.
@@ -260,6 +300,24 @@ def test_linesep(runner, linesep, expected):
     assert expected == result.output
 
 
+def test_outfile(runner, tmp_path):
+
+    """``--outfile`` writes to a file, and it is flushed on exit."""
+
+    outfile = tmp_path / 'test_outfile.txt'
+
+    result = runner.invoke(
+        _cli_entrypoint,
+        ['--gen', 'range(3)', '--outfile', str(outfile)])
+
+    assert result.exit_code == 0
+    assert not result.err
+    assert not result.output
+
+    with open(outfile) as f:
+        assert f.read() == os.linesep.join('012') + os.linesep
+
+
 def test_variable(runner):
 
     """Flags for altering variable names in the ``eval()`` scope."""
@@ -309,6 +367,21 @@ def test_setup(runner):
     assert result.output == 'itertools' + os.linesep
 
 
+def test_setup_nested_scope(runner):
+
+    """Comprehensions in setup statements can see other setup objects."""
+
+    result = runner.invoke(_cli_entrypoint, [
+        '--gen', 'range(1)',
+        '-s', 'n = 2; values = [v * n for v in range(3)]',
+        'values'
+    ])
+
+    assert result.exit_code == 0, result.err
+    assert not result.err
+    assert result.output == '[0, 2, 4]' + os.linesep
+
+
 def test_setup_syntax_error(runner):
 
     """``SyntaxError`` in a setup statement."""
@@ -326,6 +399,21 @@ def test_setup_syntax_error(runner):
     assert statement in result.err
 
 
+def test_setup_syntax_error_before_execution(runner):
+
+    """All setup statements are compiled before any are executed."""
+
+    result = runner.invoke(_cli_entrypoint, [
+        '--gen', 'range(1)',
+        '-s', 'print("executed")',
+        '-s', '1 invalid syntax'
+    ])
+
+    assert result.exit_code == 1
+    assert not result.output
+    assert 'expression contains a syntax error' in result.err
+
+
 @mock.patch.dict(os.environ, {'PYIN_FULL_TRACEBACK': ''})
 def test_PYIN_FULL_TRACEBACK(runner):
 